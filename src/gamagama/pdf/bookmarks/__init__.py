@@ -16,32 +16,37 @@ def format_toc_tree(toc):
     if not toc:
         return None
 
+    # kept is an order-preserving sublist of toc (same entry objects), so a
+    # single pointer into it marks which entries were dropped
     kept = drop_redundant_bookmarks(toc)
-    kept_set = {(e[0], e[1], e[2]) for e in kept}
+    next_kept = 0
 
-    lines = []
-    max_level = 0
+    max_level = max(entry[0] for entry in toc)
+    indents = ["  " * i for i in range(max_level)]
+    # Pad with dots to ~60 chars
+    total = 60
+
+    # Collect line pieces and join once at the end
+    out = []
     for entry in toc:
         level, title, page = entry[0], entry[1], entry[2]
-        max_level = max(max_level, level)
-        indent = "  " * (level - 1)
+        indent = indents[level - 1]
         label = f"L{level}"
-        prefix = f"{indent}{label}  {title} "
         suffix = f" p.{page}"
-        # Pad with dots to ~60 chars
-        total = 60
-        dots_needed = total - len(prefix) - len(suffix)
+        # prefix is "{indent}{label}  {title} "
+        prefix_len = len(indent) + len(label) + len(title) + 3
+        dots_needed = total - prefix_len - len(suffix)
         if dots_needed < 2:
             dots_needed = 2
-        dots = "." * dots_needed
-        line = f"{prefix}{dots}{suffix}"
-        if (level, title, page) not in kept_set:
-            line += "  [redundant — dropped by default]"
-        lines.append(line)
-
-    lines.append("")
-    lines.append(f"{max_level} levels, {len(toc)} entries")
-    return "\n".join(lines)
+        out += (indent, label, "  ", title, " ", "." * dots_needed, suffix)
+        if next_kept < len(kept) and kept[next_kept] is entry:
+            next_kept += 1
+        else:
+            out.append("  [redundant — dropped by default]")
+        out.append("\n")
+
+    out.append(f"\n{max_level} levels, {len(toc)} entries")
+    return "".join(out)
 
 
 def handle_bookmarks(args):
@@ -1,4 +1,20 @@
+import bisect
+import string
 from io import BytesIO
+from itertools import pairwise
+
+
+# Every byte except ASCII lowercase letters and digits
+_NON_ALNUM_BYTES = bytes(
+    b for b in range(256) if chr(b) not in string.ascii_lowercase + string.digits
+)
+
+
+def _normalize_key(text):
+    """Lowercase text and strip everything but ASCII letters and digits."""
+    # Non-ASCII characters are dropped by the encode, the rest by translate
+    lowered = text.lower().encode("ascii", "ignore")
+    return lowered.translate(None, _NON_ALNUM_BYTES).decode("ascii")
 
 
 def drop_redundant_bookmarks(toc):
@@ -23,83 +39,96 @@ def drop_redundant_bookmarks(toc):
         return []
 
     n = len(toc)
+    # Pull levels and pages into flat lists; titles are never read below
+    levels = [entry[0] for entry in toc]
+    pages = [entry[2] for entry in toc]
 
     # 1. Classify each entry as leaf or non-leaf
-    is_leaf = [True] * n
-    for i in range(n - 1):
-        if toc[i + 1][0] > toc[i][0]:
-            is_leaf[i] = False
-
-    # 2. Build parent mapping via a stack
+    # (an entry is a leaf unless the next entry is deeper; the last always is)
+    is_leaf = [nxt <= cur for cur, nxt in pairwise(levels)]
+    is_leaf.append(True)
+
+    # 2. Build parent mapping via a stack. An entry's subtree is complete
+    #    once it is popped, so max_desc_page (max page among the entry and
+    #    all its descendants) is propagated to the parent at that point.
+    #    Children are recorded per parent as they are pushed, split into
+    #    non-leaf and leaf lists in TOC order.
     parent = [-1] * n
+    max_desc_page = pages[:]
+    nonleaf_children = {}
+    leaf_children = {}
     stack = []  # stack of indices
-    for i in range(n):
-        level = toc[i][0]
-        while stack and toc[stack[-1]][0] >= level:
-            stack.pop()
+    for i in range(n + 1):
+        # The final i == n pass closes every entry still on the stack
+        while stack and (i == n or levels[stack[-1]] >= levels[i]):
+            k = stack.pop()
+            if stack and max_desc_page[k] > max_desc_page[stack[-1]]:
+                max_desc_page[stack[-1]] = max_desc_page[k]
+        if i == n:
+            break
         if stack:
             parent[i] = stack[-1]
+        children = leaf_children if is_leaf[i] else nonleaf_children
+        children.setdefault(parent[i], []).append(i)
         stack.append(i)
 
-    # 3a. Compute bounded_end for each non-leaf entry:
-    #     page of the next non-leaf sibling (same parent) in TOC order
+    # 3. Compute bounded_end for each non-leaf entry:
+    #    page of the next non-leaf sibling (same parent) in TOC order
     bounded_end = [None] * n
-    for i in range(n):
-        if is_leaf[i]:
-            continue
-        p = parent[i]
-        level = toc[i][0]
-        for j in range(i + 1, n):
-            if parent[j] == p and toc[j][0] == level and not is_leaf[j]:
-                bounded_end[i] = toc[j][2]
-                break
-
-    # 3b. Compute max_desc_page for each non-leaf entry:
-    #     max page among all descendants (propagated bottom-up)
-    max_desc_page = [toc[i][2] for i in range(n)]
-    for i in range(n - 1, -1, -1):
-        if parent[i] != -1:
-            p = parent[i]
-            if max_desc_page[i] > max_desc_page[p]:
-                max_desc_page[p] = max_desc_page[i]
-
-    # 4. For each leaf, check if its page falls within a non-leaf sibling's span
+    for siblings in nonleaf_children.values():
+        next_page_by_level = {}
+        for j in reversed(siblings):
+            bounded_end[j] = next_page_by_level.get(levels[j])
+            next_page_by_level[levels[j]] = pages[j]
+
+    # 4. For each leaf, check if its page falls within a non-leaf sibling's span.
+    #    A sibling's span is [start, end) where end is the larger of its
+    #    bounded end and its max descendant page. Spans may overlap, so sort
+    #    them by start and keep a running max of ends: a page is covered iff
+    #    the furthest-reaching span starting at or before it extends past it.
     redundant = set()
-    for i in range(n):
-        if not is_leaf[i]:
+    for p, siblings in nonleaf_children.items():
+        leaves = leaf_children.get(p)
+        if not leaves:
             continue
-        page = toc[i][2]
-        p = parent[i]
-        for j in range(n):
-            if j == i or is_leaf[j] or parent[j] != p:
-                continue
-            start = toc[j][2]
-            # Check bounded span [start, bounded_end)
-            end = bounded_end[j]
-            if end is not None and start <= page < end:
-                redundant.add(i)
-                break
-            # Check content span [start, max_desc_page)
-            mdp = max_desc_page[j]
-            if start <= page < mdp:
+        spans = []
+        for j in siblings:
+            end = max_desc_page[j]
+            if bounded_end[j] is not None and bounded_end[j] > end:
+                end = bounded_end[j]
+            spans.append((pages[j], end))
+        spans.sort()
+        starts = []
+        reach = []
+        furthest = None
+        for start, end in spans:
+            if furthest is None or end > furthest:
+                furthest = end
+            starts.append(start)
+            reach.append(furthest)
+        for i in leaves:
+            page = pages[i]
+            k = bisect.bisect_right(starts, page) - 1
+            if k >= 0 and page < reach[k]:
                 redundant.add(i)
-                break
 
     # 5. Structural-leaf heuristic: at root level, if both leaf and
     #    non-leaf entries exist, leaf entries are index-style and redundant
-    root_has_nonleaf = any(not is_leaf[i] for i in range(n) if parent[i] == -1)
-    if root_has_nonleaf:
-        for i in range(n):
-            if parent[i] == -1 and is_leaf[i]:
-                redundant.add(i)
+    if -1 in nonleaf_children:
+        redundant.update(leaf_children.get(-1, ()))
 
     return [toc[i] for i in range(n) if i not in redundant]
 
 
 def _prepare_heading_source(input_path, strategy, drop_empty=True, fuzzy_match=True,
-                            conv_result=None):
+                            conv_result=None, pdf_doc=None):
     """Prepare the source argument for ResultPostprocessor based on strategy.
 
+    Args:
+        pdf_doc: Optional fitz.Document already opened on input_path. It is
+            used (and its TOC rewritten) instead of reopening the file; the
+            caller keeps ownership and closes it.
+
     Returns:
         (source, title_map) tuple where source is None for "none",
         BytesIO for "bookmarks"/"numbering", and title_map is a dict
@@ -108,28 +137,26 @@ def _prepare_heading_source(input_path, strategy, drop_empty=True, fuzzy_match=T
     """
     if strategy == "none":
         return (None, {})
-    if strategy == "numbering":
+    doc = pdf_doc
+    if doc is None:
         import fitz
         doc = fitz.open(str(input_path))
+    if strategy == "numbering":
         doc.set_toc([])
-        buf = BytesIO()
-        doc.save(buf)
-        doc.close()
-        buf.seek(0)
-        return (buf, {})
-    # bookmarks strategy
-    import fitz
-    doc = fitz.open(str(input_path))
-    toc = doc.get_toc()
-    if drop_empty:
-        toc = drop_redundant_bookmarks(toc)
-    title_map = _build_title_map(toc)
-    if fuzzy_match and conv_result is not None:
-        toc = normalize_toc_titles(toc, conv_result)
-    doc.set_toc(toc)
+        title_map = {}
+    else:
+        # bookmarks strategy
+        toc = doc.get_toc()
+        if drop_empty:
+            toc = drop_redundant_bookmarks(toc)
+        title_map = _build_title_map(toc)
+        if fuzzy_match and conv_result is not None:
+            toc = normalize_toc_titles(toc, conv_result)
+        doc.set_toc(toc)
     buf = BytesIO()
     doc.save(buf)
-    doc.close()
+    if pdf_doc is None:
+        doc.close()
     buf.seek(0)
     return (buf, title_map)
 
@@ -145,17 +172,12 @@ def _build_title_map(toc):
              before fuzzy normalization).
 
     Returns:
-        Dict mapping normalize_key(title) → title.
+        Dict mapping _normalize_key(title) → title.
     """
-    import re
-
-    def normalize_key(text):
-        return re.sub(r"[^a-z0-9]", "", text.lower())
-
     result = {}
     for entry in toc:
         title = " ".join(entry[1].split())  # collapse newlines/whitespace
-        key = normalize_key(title)
+        key = _normalize_key(title)
         if key and key not in result:
             result[key] = title
     return result
@@ -171,30 +193,37 @@ def restore_bookmark_casing(conv_result, title_map):
 
     Args:
         conv_result: A docling ConversionResult with .document.texts.
-        title_map: Dict from normalize_key(title) → original bookmark title.
+        title_map: Dict from _normalize_key(title) → original bookmark title.
     """
-    import re
     from docling_core.types.doc.document import SectionHeaderItem
 
-    def normalize_key(text):
-        return re.sub(r"[^a-z0-9]", "", text.lower())
-
-    for item in conv_result.document.texts:
-        if isinstance(item, SectionHeaderItem):
-            key = normalize_key(item.text)
-            if key in title_map:
-                item.text = title_map[key]
-                item.orig = title_map[key]
-            elif key:
-                # Prefix match for truncated headings (e.g. docling extracts
-                # "Part I:" but bookmark is "Part I: Character Law").
-                # Use original text comparison to preserve word boundaries.
-                heading_lower = item.text.strip().lower()
-                candidates = [v for v in title_map.values()
-                              if v.strip().lower().startswith(heading_lower)]
-                if len(candidates) == 1:
-                    item.text = candidates[0]
-                    item.orig = candidates[0]
+    headers = [item for item in conv_result.document.texts
+               if isinstance(item, SectionHeaderItem)]
+    if not headers or not title_map:
+        return
+
+    # Lowercased titles sorted for prefix matching: every title starting with
+    # a given prefix sits in one contiguous run found by bisection
+    lowered_titles = sorted((v.strip().lower(), v) for v in title_map.values())
+    lowered_keys = [lowered for lowered, _ in lowered_titles]
+
+    for item in headers:
+        key = _normalize_key(item.text)
+        if key in title_map:
+            item.text = title_map[key]
+            item.orig = title_map[key]
+        elif key:
+            # Prefix match for truncated headings (e.g. docling extracts
+            # "Part I:" but bookmark is "Part I: Character Law").
+            # Use original text comparison to preserve word boundaries.
+            # Only a unique match is used, so two entries of the run suffice.
+            heading_lower = item.text.strip().lower()
+            lo = bisect.bisect_left(lowered_keys, heading_lower)
+            candidates = [v for lowered, v in lowered_titles[lo:lo + 2]
+                          if lowered.startswith(heading_lower)]
+            if len(candidates) == 1:
+                item.text = candidates[0]
+                item.orig = candidates[0]
 
 
 def normalize_toc_titles(toc, conv_result):
@@ -212,16 +241,11 @@ def normalize_toc_titles(toc, conv_result):
     Returns:
         Modified TOC list with titles rewritten where matches are found.
     """
-    import re
-
-    def normalize_key(text):
-        return re.sub(r"[^a-z0-9]", "", text.lower())
-
     # Build lookup from document text items
     lookup = {}
     for text_item in conv_result.document.texts:
         orig = text_item.text
-        key = normalize_key(orig)
+        key = _normalize_key(orig)
         if key and key not in lookup:
             lookup[key] = orig
 
@@ -229,7 +253,7 @@ def normalize_toc_titles(toc, conv_result):
     result = []
     for entry in toc:
         level, title, page = entry[0], entry[1], entry[2]
-        key = normalize_key(title)
+        key = _normalize_key(title)
         if key in lookup:
             result.append([level, lookup[key], page])
         else:
@@ -170,54 +170,71 @@ def handle_convert(args):
     )
     from docling_core.types.doc.base import ImageRefMode
 
-    # Configure pipeline
-    pipeline_options = PdfPipelineOptions(
-        do_table_structure=True,
-        table_structure_options=TableStructureOptions(
-            mode=TableFormerMode.ACCURATE,
-        ),
-        do_ocr=args.ocr,
-        generate_page_images=False,
-        generate_picture_images=False,
-    )
-    converter = DocumentConverter(
-        allowed_formats=[InputFormat.PDF],
-        format_options={
-            InputFormat.PDF: PdfFormatOption(
-                pipeline_options=pipeline_options,
+    # Open the PDF for heading post-processing up front: an unreadable file
+    # fails before the long conversion, and the open document is reused
+    # instead of reparsing the file afterwards.
+    strategy = args.heading_strategy
+    pdf_doc = None
+    if strategy != "none":
+        import fitz
+        try:
+            pdf_doc = fitz.open(str(input_path))
+        except Exception as e:
+            print(f"Error: cannot open {input_path}: {e}", file=sys.stderr)
+            sys.exit(1)
+
+    try:
+        # Configure pipeline
+        pipeline_options = PdfPipelineOptions(
+            do_table_structure=True,
+            table_structure_options=TableStructureOptions(
+                mode=TableFormerMode.ACCURATE,
             ),
-        },
-    )
+            do_ocr=args.ocr,
+            generate_page_images=False,
+            generate_picture_images=False,
+        )
+        converter = DocumentConverter(
+            allowed_formats=[InputFormat.PDF],
+            format_options={
+                InputFormat.PDF: PdfFormatOption(
+                    pipeline_options=pipeline_options,
+                ),
+            },
+        )
 
-    # Convert
-    print(f"Converting {input_path.name}...")
-    page_range = parse_page_range(args.pages)
-    result = converter.convert(
-        str(input_path),
-        raises_on_error=False,
-        page_range=page_range,
-    )
+        # Convert
+        print(f"Converting {input_path.name}...")
+        page_range = parse_page_range(args.pages)
+        result = converter.convert(
+            str(input_path),
+            raises_on_error=False,
+            page_range=page_range,
+        )
 
-    # Check status
-    if result.status == ConversionStatus.FAILURE:
-        print("Error: conversion failed.", file=sys.stderr)
-        for err in result.errors:
-            print(f"  {err.error_message}", file=sys.stderr)
-        sys.exit(1)
-    if result.status == ConversionStatus.PARTIAL_SUCCESS:
-        print("Warning: conversion partially succeeded. Some content may be missing.")
-        for err in result.errors:
-            print(f"  {err.error_message}", file=sys.stderr)
+        # Check status
+        if result.status == ConversionStatus.FAILURE:
+            print("Error: conversion failed.", file=sys.stderr)
+            for err in result.errors:
+                print(f"  {err.error_message}", file=sys.stderr)
+            sys.exit(1)
+        if result.status == ConversionStatus.PARTIAL_SUCCESS:
+            print("Warning: conversion partially succeeded. Some content may be missing.")
+            for err in result.errors:
+                print(f"  {err.error_message}", file=sys.stderr)
+
+        # Infer heading hierarchy from PDF bookmarks, numbering, or font styles
+        drop_empty = not getattr(args, "no_drop_empty_bookmarks", False)
+        fuzzy_match = not getattr(args, "no_fuzzy_match", False)
+        source, title_map = _prepare_heading_source(
+            input_path, strategy,
+            drop_empty=drop_empty, fuzzy_match=fuzzy_match,
+            conv_result=result, pdf_doc=pdf_doc,
+        )
+    finally:
+        if pdf_doc is not None:
+            pdf_doc.close()
 
-    # Infer heading hierarchy from PDF bookmarks, numbering, or font styles
-    strategy = args.heading_strategy
-    drop_empty = not getattr(args, "no_drop_empty_bookmarks", False)
-    fuzzy_match = not getattr(args, "no_fuzzy_match", False)
-    source, title_map = _prepare_heading_source(
-        input_path, strategy,
-        drop_empty=drop_empty, fuzzy_match=fuzzy_match,
-        conv_result=result,
-    )
     if source is not None:
         # The hierarchical library indexes result.pages as result.pages[page_no - 1],
         # assuming the PDF starts at page 1. When --pages specifies a range that
@@ -271,12 +288,14 @@ def handle_convert(args):
 
     # OCR hint (only when OCR is off)
     if not args.ocr:
-        pages_with_text = set()
+        # Drop pages as text is found on them; stop once every page has some
+        pages_without_text = set(doc.pages.keys())
         for text_item in doc.texts:
             for prov in text_item.prov:
-                pages_with_text.add(prov.page_no)
-        all_pages = set(doc.pages.keys())
-        empty_pages = sorted(all_pages - pages_with_text)
+                pages_without_text.discard(prov.page_no)
+            if not pages_without_text:
+                break
+        empty_pages = sorted(pages_without_text)
         if empty_pages:
             n = len(empty_pages)
             print(
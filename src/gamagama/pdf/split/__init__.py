@@ -1,66 +1,128 @@
 import re
+import string
 import sys
+from functools import lru_cache
+from itertools import islice
 from pathlib import Path
 
+# Common chapter/section prefixes dropped from slugs
+_PREFIX_RE = re.compile(
+    r"^(chapter|part|section|appendix)\s+[\dA-Za-z]+[:\-\.\s]\s*", re.IGNORECASE
+)
+# Maps ASCII lowercase letters and digits to themselves, every other byte to a space
+_SLUG_BYTES = bytes(
+    b if chr(b) in string.ascii_lowercase + string.digits else 0x20 for b in range(256)
+)
+# Longest slug used in split-md filenames
+_MAX_SLUG_LENGTH = 80
+_IMAGE_PLACEHOLDER_RE = re.compile(r"^!\[.*?\]\(image://.*?\)\s*$", re.MULTILINE)
+_EXCESS_BLANK_LINES_RE = re.compile(r"\n{3,}")
 
-def slugify(text, max_length=80):
-    """Convert heading text to a filename-safe slug.
 
-    Truncates at a hyphen boundary if the slug exceeds max_length.
-    Pass max_length=None to disable truncation.
+@lru_cache(maxsize=None)
+def _heading_re(level):
+    """Compiled pattern matching headings of exactly the given level."""
+    return re.compile(r"^(#{" + str(level) + r"})(?!#)\s+(.+)$", re.MULTILINE)
+
+
+def _iter_headings(text, level):
+    """Yield the same matches as _heading_re(level).finditer(text).
+
+    Candidate line starts are located with str.find on the newline plus
+    hash run, and the pattern is only tried there, so the regex engine
+    never walks body text.
     """
+    pattern = _heading_re(level)
+    line_prefix = "\n" + "#" * level
+    pos = 0
+    if not text.startswith(line_prefix[1:]):
+        pos = text.find(line_prefix)
+        if pos == -1:
+            return
+        pos += 1
+    while True:
+        match = pattern.match(text, pos)
+        if match:
+            yield match
+            pos = match.end()
+        pos = text.find(line_prefix, pos)
+        if pos == -1:
+            return
+        pos += 1
+
+
+@lru_cache(maxsize=1024)
+def _slugify(text, max_length):
+    """Return (slug, truncated) for heading text; see slugify."""
     # Strip common chapter/section prefixes
-    text = re.sub(
-        r"^(chapter|part|section|appendix)\s+[\dA-Za-z]+[:\-\.\s]\s*",
-        "",
-        text,
-        flags=re.IGNORECASE,
-    )
-    text = text.lower()
-    text = re.sub(r"[^a-z0-9]+", "-", text)
-    text = text.strip("-")
+    text = _PREFIX_RE.sub("", text)
+    # Non-ASCII characters become "?" and then, like all other separators, a
+    # space; splitting on whitespace joins the remaining runs with single hyphens
+    words = text.lower().encode("ascii", "replace").translate(_SLUG_BYTES).split()
+    text = b"-".join(words).decode("ascii")
     text = text or "untitled"
-    if max_length is not None and len(text) > max_length:
+    truncated = max_length is not None and len(text) > max_length
+    if truncated:
         text = text[:max_length].rsplit("-", 1)[0]
-    return text
+    return text, truncated
 
 
-def split_markdown(text, level=2):
-    """Split markdown text on headings of the given level.
+def slugify(text, max_length=_MAX_SLUG_LENGTH):
+    """Convert heading text to a filename-safe slug.
 
-    Returns a list of (heading_text, body) tuples. The first tuple has an
-    empty heading string for any preamble content before the first heading.
+    Truncates at a hyphen boundary if the slug exceeds max_length.
+    Pass max_length=None to disable truncation.
     """
-    pattern = re.compile(
-        r"^(#{" + str(level) + r"})(?!#)\s+(.+)$", re.MULTILINE
-    )
-    sections = []
+    return _slugify(text, max_length)[0]
+
+
+def split_markdown_spans(text, level=2):
+    """Locate the sections split_markdown would return, without slicing.
+
+    Returns a list of (heading_text, start, end) tuples, where the body of
+    each section is text[start:end]. The first tuple is the preamble.
+    """
+    spans = []
     last_end = 0
     last_heading = ""
 
-    for match in pattern.finditer(text):
-        body = text[last_end : match.start()]
-        sections.append((last_heading, body))
+    for match in _iter_headings(text, level):
+        spans.append((last_heading, last_end, match.start()))
         last_heading = match.group(2)
         last_end = match.end()
 
     # Remaining text after last heading
-    sections.append((last_heading, text[last_end:]))
-    return sections
+    spans.append((last_heading, last_end, len(text)))
+    return spans
+
+
+def split_markdown(text, level=2):
+    """Split markdown text on headings of the given level.
+
+    Returns a list of (heading_text, body) tuples. The first tuple has an
+    empty heading string for any preamble content before the first heading.
+    """
+    return [
+        (heading, text[start:end]) for heading, start, end in split_markdown_spans(text, level)
+    ]
 
 
 def strip_image_placeholders(text):
     """Remove docling image placeholder lines and collapse excess blank lines."""
-    text = re.sub(r"^!\[.*?\]\(image://.*?\)\s*$", "", text, flags=re.MULTILINE)
-    text = re.sub(r"\n{3,}", "\n\n", text)
+    # Substring checks are far cheaper than a regex scan and skip bodies
+    # that cannot match (most bodies have no images)
+    if "](image://" in text:
+        text = _IMAGE_PLACEHOLDER_RE.sub("", text)
+    if "\n\n\n" in text:
+        text = _EXCESS_BLANK_LINES_RE.sub("\n\n", text)
     return text
 
 
 def find_split_level(text):
     """Find shallowest heading level that produces more than 1 split."""
     for level in range(1, 7):
-        sections = split_markdown(text, level)
-        if len(sections) > 2:  # >2 because first entry is preamble
+        # Two headings give more than one split (the first section is preamble)
+        if len(list(islice(_iter_headings(text, level), 2))) == 2:
             return level
     return 2  # fallback
 
@@ -78,34 +140,32 @@ def handle_split_md(args):
     level = args.level
     if level is None:
         level = find_split_level(text)
-    sections = split_markdown(text, level)
 
-    # Build list of (path, content) pairs
+    # Plan output files as (path, heading, start, end); each section body is
+    # sliced and cleaned only when it is written. The preamble has no heading.
     files_to_write = []
-    for i, (heading, body) in enumerate(sections):
-        body = strip_image_placeholders(body).strip()
+    warnings = []
+    for i, (heading, start, end) in enumerate(split_markdown_spans(text, level)):
         if i == 0:
-            if not body:
+            if not strip_image_placeholders(text[start:end]).strip():
                 continue
-            filename = "00-preamble.md"
-            content = body + "\n"
-        else:
-            slug = slugify(heading)
-            if slug != slugify(heading, max_length=None):
-                preview = heading.strip()[:80]
-                print(
-                    f"Warning: heading too long, truncated for filename "
-                    f"(section {i}): \"{preview}...\"",
-                    file=sys.stderr,
-                )
-            filename = f"{i:02d}-{slug}.md"
-            hashes = "#" * level
-            content = f"{hashes} {heading}\n\n{body}\n"
-        files_to_write.append((output_dir / filename, content))
+            files_to_write.append((output_dir / "00-preamble.md", None, start, end))
+            continue
+        slug, truncated = _slugify(heading, _MAX_SLUG_LENGTH)
+        if truncated:
+            preview = heading.strip()[:80]
+            warnings.append(
+                f"Warning: heading too long, truncated for filename "
+                f"(section {i}): \"{preview}...\""
+            )
+        files_to_write.append((output_dir / f"{i:02d}-{slug}.md", heading, start, end))
+    # Emitted together rather than one stderr write per long heading
+    if warnings:
+        print("\n".join(warnings), file=sys.stderr)
 
     # Batch overwrite check
     if not args.force:
-        existing = [p for p, _ in files_to_write if p.exists()]
+        existing = [p for p, *_ in files_to_write if p.exists()]
         if existing:
             for p in existing:
                 print(f"Error: {p} already exists. Use --force to overwrite.", file=sys.stderr)
@@ -113,10 +173,24 @@ def handle_split_md(args):
 
     # Write files
     output_dir.mkdir(parents=True, exist_ok=True)
-    for path, content in files_to_write:
-        path.write_text(content)
+    hashes = "#" * level
+    # Without --force, open exclusively so a file created after the check
+    # above is still never overwritten
+    mode = "w" if args.force else "x"
+    for path, heading, start, end in files_to_write:
+        body = strip_image_placeholders(text[start:end]).strip()
+        if heading is None:
+            content = body + "\n"
+        else:
+            content = f"{hashes} {heading}\n\n{body}\n"
+        try:
+            with path.open(mode) as f:
+                f.write(content)
+        except FileExistsError:
+            print(f"Error: {path} already exists. Use --force to overwrite.", file=sys.stderr)
+            sys.exit(1)
 
     # Summary
     print(f"Split {input_path.name} into {len(files_to_write)} files in {output_dir}/")
-    for path, _ in files_to_write:
+    for path, *_ in files_to_write:
         print(f"  {path.name}")
@@ -0,0 +1,9 @@
+import pytest
+
+from gamagama.pdf.main import build_parser
+
+
+@pytest.fixture(scope="session")
+def parser():
+    """The gg-pdf argument parser, built once per session."""
+    return build_parser()
@@ -1,8 +1,7 @@
-import sys
-from unittest.mock import MagicMock
+import re
+from types import SimpleNamespace
 
 import pytest
-from fpdf import FPDF
 
 from gamagama.pdf.bookmarks import format_toc_tree, handle_bookmarks
 
@@ -10,6 +9,16 @@ from gamagama.pdf.bookmarks import format_toc_tree, handle_bookmarks
 # --- format_toc_tree tests ---
 
 
+def _parse_formatted_toc(result):
+    """Map each entry title in format_toc_tree output to (indent, line)."""
+    parsed = {}
+    for line in result.splitlines():
+        match = re.match(r"( *)L\d+  (.+?) \.+ p\.\d+", line)
+        if match:
+            parsed[match.group(2)] = (len(match.group(1)), line)
+    return parsed
+
+
 def test_format_toc_tree_empty():
     assert format_toc_tree([]) is None
 
@@ -32,16 +41,12 @@ def test_format_toc_tree_nested():
         [2, "Chapter 3", 51],
     ]
     result = format_toc_tree(toc)
+    parsed = _parse_formatted_toc(result)
     # L1 entries with children should NOT be annotated
-    assert "Part I" in result
-    assert "Part II" in result
-    for line in result.splitlines():
-        if "Part I" in line or "Part II" in line:
-            assert "redundant" not in line
+    assert "redundant" not in parsed["Part I"][1]
+    assert "redundant" not in parsed["Part II"][1]
     # L2 entries should be indented
-    for line in result.splitlines():
-        if "Chapter 1" in line:
-            assert line.startswith("  ")
+    assert parsed["Chapter 1"][0] == 2
     assert "2 levels, 5 entries" in result
 
 
@@ -55,12 +60,24 @@ def test_format_toc_tree_redundant_annotated():
         [2, "Chapter 3", 51],
         [1, "Index Entry", 5],  # page 5 falls within Part I's bounded span [1, 50)
     ]
+    parsed = _parse_formatted_toc(format_toc_tree(toc))
+    assert "redundant" in parsed["Index Entry"][1]
+    assert "redundant" not in parsed["Part I"][1]
+    assert "redundant" not in parsed["Part II"][1]
+
+
+def test_format_toc_tree_duplicate_entries_annotated_individually():
+    """An entry identical to a kept one is still annotated when it is dropped."""
+    toc = [
+        [1, "Part I", 1],
+        [2, "Chapter 1", 2],
+        [1, "Part I", 1],  # same values as the structural entry, but a root leaf
+    ]
     result = format_toc_tree(toc)
-    for line in result.splitlines():
-        if "Index Entry" in line:
-            assert "redundant" in line
-        if "Part I" in line:
-            assert "redundant" not in line
+    part_lines = [line for line in result.splitlines() if "Part I" in line]
+    assert len(part_lines) == 2
+    assert "redundant" not in part_lines[0]
+    assert "redundant" in part_lines[1]
 
 
 def test_format_toc_tree_three_levels():
@@ -72,35 +89,46 @@ def test_format_toc_tree_three_levels():
     result = format_toc_tree(toc)
     assert "3 levels, 3 entries" in result
     # L3 should have 4 spaces indent
-    for line in result.splitlines():
-        if "Section A" in line:
-            assert line.startswith("    ")
+    assert _parse_formatted_toc(result)["Section A"][0] == 4
 
 
 def test_format_toc_tree_dot_leaders():
     toc = [[1, "Intro", 1]]
     result = format_toc_tree(toc)
     # Should contain dots between title and page number
-    for line in result.splitlines():
-        if "Intro" in line:
-            assert ".." in line
+    assert "Intro .." in _parse_formatted_toc(result)["Intro"][1]
 
 
 # --- handle_bookmarks tests ---
 
 
 def test_handle_bookmarks_file_not_found(tmp_path):
-    args = MagicMock()
-    args.input = str(tmp_path / "nonexistent.pdf")
+    args = SimpleNamespace(input=str(tmp_path / "nonexistent.pdf"))
 
     with pytest.raises(SystemExit) as exc_info:
         handle_bookmarks(args)
     assert exc_info.value.code == 1
 
 
-@pytest.fixture
-def pdf_with_bookmarks(tmp_path):
-    """Create a PDF with bookmarks using fpdf2."""
+def _save_with_toc(pdf_bytes, toc, path):
+    """Write PDF bytes to path with toc set as its bookmarks.
+
+    fpdf2 bookmark support is limited, so the TOC is set with PyMuPDF on
+    the in-memory output and the result is saved once.
+    """
+    import fitz
+
+    doc = fitz.open(stream=pdf_bytes, filetype="pdf")
+    doc.set_toc(toc)
+    doc.save(str(path))
+    doc.close()
+
+
+@pytest.fixture(scope="session")
+def pdf_with_bookmarks(tmp_path_factory):
+    """Create a PDF with bookmarks using fpdf2 (once per session)."""
+    from fpdf import FPDF
+
     pdf = FPDF()
     pdf.set_auto_page_break(auto=False)
 
@@ -116,39 +144,32 @@ def pdf_with_bookmarks(tmp_path):
     pdf.set_font("Helvetica", "B", 14)
     pdf.cell(text="Section 1.1")
 
-    path = tmp_path / "bookmarks.pdf"
-    pdf.output(str(path))
-
-    # Add bookmarks using PyMuPDF since fpdf2 bookmark support is limited
-    import fitz
-
-    doc = fitz.open(str(path))
+    path = tmp_path_factory.mktemp("pdfs") / "bookmarks.pdf"
     toc = [
         [1, "Introduction", 1],
         [1, "Chapter 1", 2],
         [2, "Section 1.1", 3],
     ]
-    doc.set_toc(toc)
-    doc.save(str(path), incremental=True, encryption=0)
-    doc.close()
+    _save_with_toc(bytes(pdf.output()), toc, path)
     return path
 
 
-@pytest.fixture
-def pdf_without_bookmarks(tmp_path):
-    """Create a PDF without bookmarks."""
+@pytest.fixture(scope="session")
+def pdf_without_bookmarks(tmp_path_factory):
+    """Create a PDF without bookmarks (once per session)."""
+    from fpdf import FPDF
+
     pdf = FPDF()
     pdf.add_page()
     pdf.set_font("Helvetica", size=12)
     pdf.cell(text="Hello World")
-    path = tmp_path / "no_bookmarks.pdf"
-    pdf.output(str(path))
+    path = tmp_path_factory.mktemp("pdfs") / "no_bookmarks.pdf"
+    pdf.output(path)
     return path
 
 
 def test_handle_bookmarks_with_bookmarks(pdf_with_bookmarks, capsys):
-    args = MagicMock()
-    args.input = str(pdf_with_bookmarks)
+    args = SimpleNamespace(input=str(pdf_with_bookmarks))
 
     handle_bookmarks(args)
 
@@ -160,8 +181,7 @@ def test_handle_bookmarks_with_bookmarks(pdf_with_bookmarks, capsys):
 
 
 def test_handle_bookmarks_no_bookmarks(pdf_without_bookmarks, capsys):
-    args = MagicMock()
-    args.input = str(pdf_without_bookmarks)
+    args = SimpleNamespace(input=str(pdf_without_bookmarks))
 
     handle_bookmarks(args)
 
@@ -170,20 +190,23 @@ def test_handle_bookmarks_no_bookmarks(pdf_without_bookmarks, capsys):
     assert "numbering" in captured.out
 
 
-def test_handle_bookmarks_annotates_redundant(tmp_path, capsys):
-    """A leaf L1 whose page falls within a non-leaf sibling's span is annotated."""
+@pytest.fixture(scope="session")
+def five_page_pdf_bytes():
+    """Bytes of a 5-page PDF without bookmarks; tests add their own TOC."""
+    from fpdf import FPDF
+
     pdf = FPDF()
     pdf.set_auto_page_break(auto=False)
     for _ in range(5):
         pdf.add_page()
         pdf.set_font("Helvetica", size=12)
         pdf.cell(text="content")
-    path = tmp_path / "test.pdf"
-    pdf.output(str(path))
+    return bytes(pdf.output())
 
-    import fitz
 
-    doc = fitz.open(str(path))
+def test_handle_bookmarks_annotates_redundant(five_page_pdf_bytes, tmp_path, capsys):
+    """A leaf L1 whose page falls within a non-leaf sibling's span is annotated."""
+    path = tmp_path / "test.pdf"
     toc = [
         [1, "Part I", 1],
         [2, "Chapter 1", 2],
@@ -192,36 +215,23 @@ def test_handle_bookmarks_annotates_redundant(tmp_path, capsys):
         [1, "Part II", 4],
         [2, "Chapter 3", 5],
     ]
-    doc.set_toc(toc)
-    doc.save(str(path), incremental=True, encryption=0)
-    doc.close()
+    _save_with_toc(five_page_pdf_bytes, toc, path)
 
-    args = MagicMock()
-    args.input = str(path)
+    args = SimpleNamespace(input=str(path))
     handle_bookmarks(args)
 
-    captured = capsys.readouterr()
-    for line in captured.out.splitlines():
-        if "Index" in line:
-            assert "redundant" in line
-        if "Part I" in line:
-            assert "redundant" not in line
-
-
-def test_bookmarks_help():
-    result = __import__("subprocess").run(
-        [sys.executable, "-m", "gamagama.pdf", "bookmarks", "--help"],
-        capture_output=True,
-        text=True,
-    )
-    assert result.returncode == 0
-    assert "input" in result.stdout
-
-
-def test_help_lists_bookmarks_subcommand():
-    result = __import__("subprocess").run(
-        [sys.executable, "-m", "gamagama.pdf", "--help"],
-        capture_output=True,
-        text=True,
-    )
-    assert "bookmarks" in result.stdout
+    parsed = _parse_formatted_toc(capsys.readouterr().out)
+    assert "redundant" in parsed["Index"][1]
+    assert "redundant" not in parsed["Part I"][1]
+    assert "redundant" not in parsed["Part II"][1]
+
+
+def test_bookmarks_help(parser, capsys):
+    with pytest.raises(SystemExit) as exc_info:
+        parser.parse_args(["bookmarks", "--help"])
+    assert exc_info.value.code == 0
+    assert "input" in capsys.readouterr().out
+
+
+def test_help_lists_bookmarks_subcommand(parser):
+    assert "bookmarks" in parser.format_help()
@@ -1,10 +1,11 @@
 import json
 import sys
+from enum import Enum
 from io import BytesIO
-from unittest.mock import patch, MagicMock
+from types import SimpleNamespace
+from unittest.mock import MagicMock
 
 import pytest
-from fpdf import FPDF
 
 from gamagama.pdf.convert import handle_convert
 from gamagama.pdf.convert.pipeline import parse_page_range
@@ -17,19 +18,41 @@ from gamagama.pdf.convert.headings import (
 )
 
 
-# --- parse_page_range tests ---
+def _args(**overrides):
+    """Build handle_convert args; heading post-processing is off unless overridden."""
+    defaults = dict(
+        input=None,
+        output_dir=".",
+        force=False,
+        ocr=False,
+        pages=None,
+        heading_strategy="none",
+        no_drop_empty_bookmarks=False,
+        no_fuzzy_match=False,
+    )
+    return SimpleNamespace(**{**defaults, **overrides})
 
 
-def test_parse_page_range_none():
-    assert parse_page_range(None) == (1, sys.maxsize)
+# --- parse_page_range tests ---
 
 
-def test_parse_page_range_single():
-    assert parse_page_range("5") == (5, 5)
+@pytest.mark.parametrize(
+    "value, expected",
+    [
+        (None, (1, sys.maxsize)),
+        ("5", (5, 5)),
+        ("1-50", (1, 50)),
+    ],
+    ids=["none", "single", "range"],
+)
+def test_parse_page_range(value, expected):
+    assert parse_page_range(value) == expected
 
 
-def test_parse_page_range_range():
-    assert parse_page_range("1-50") == (1, 50)
+@pytest.mark.parametrize("value", ["", "abc"], ids=["empty", "non_numeric"])
+def test_parse_page_range_rejects_non_numbers(value):
+    with pytest.raises(ValueError):
+        parse_page_range(value)
 
 
 # --- overwrite protection ---
@@ -43,69 +66,85 @@ def test_convert_refuses_overwrite_without_force(tmp_path):
     existing_md = tmp_path / "test.md"
     existing_md.write_text("existing content")
 
-    args = MagicMock()
-    args.input = str(fake_pdf)
-    args.output_dir = str(tmp_path)
-    args.force = False
-    args.ocr = False
-    args.pages = None
+    args = _args(input=str(fake_pdf), output_dir=str(tmp_path))
 
     with pytest.raises(SystemExit) as exc_info:
         handle_convert(args)
     assert exc_info.value.code == 1
 
 
-def test_convert_refuses_overwrite_late_check(tmp_path):
+class _ConversionStatus(Enum):
+    """Stand-in for docling's ConversionStatus."""
+
+    SUCCESS = "success"
+    PARTIAL_SUCCESS = "partial_success"
+    FAILURE = "failure"
+
+
+@pytest.fixture
+def fake_docling(monkeypatch):
+    """Install stand-in docling and hierarchical modules for the duration of a test."""
+    modules = {
+        "docling.document_converter": MagicMock(),
+        "docling.datamodel.base_models": MagicMock(),
+        "docling.datamodel.pipeline_options": MagicMock(),
+        "docling_core.types.doc.base": MagicMock(),
+        "hierarchical": MagicMock(),
+        "hierarchical.postprocessor": MagicMock(),
+    }
+    modules["docling.datamodel.base_models"].ConversionStatus = _ConversionStatus
+    for name, module in modules.items():
+        monkeypatch.setitem(sys.modules, name, module)
+    return modules
+
+
+def test_convert_refuses_overwrite_late_check(tmp_path, fake_docling):
     """When output files appear during conversion, exit with error before writing."""
     fake_pdf = tmp_path / "test.pdf"
     fake_pdf.touch()
 
-    args = MagicMock()
-    args.input = str(fake_pdf)
-    args.output_dir = str(tmp_path)
-    args.force = False
-    args.ocr = False
-    args.pages = None
-    args.heading_strategy = "none"
-    args.no_drop_empty_bookmarks = False
-    args.no_fuzzy_match = False
-
-    mock_status = MagicMock()
-    mock_status.__eq__ = lambda self, other: other.name == "FAILURE"
+    args = _args(input=str(fake_pdf), output_dir=str(tmp_path))
 
     # Simulate files appearing after the early check but during conversion
     def fake_convert(*a, **kw):
         (tmp_path / "test.md").write_text("sneaky content")
         (tmp_path / "test.json").write_text("{}")
         result = MagicMock()
-        result.status = mock_status
+        result.status = _ConversionStatus.SUCCESS
         result.document = MagicMock()
         return result
 
-    fake_docling = {
-        "docling.document_converter": MagicMock(),
-        "docling.datamodel.base_models": MagicMock(),
-        "docling.datamodel.pipeline_options": MagicMock(),
-        "docling_core.types.doc.base": MagicMock(),
-        "hierarchical": MagicMock(),
-        "hierarchical.postprocessor": MagicMock(),
-    }
     fake_docling["docling.document_converter"].DocumentConverter.return_value.convert = fake_convert
 
-    with patch.dict("sys.modules", fake_docling):
-        with pytest.raises(SystemExit) as exc_info:
-            handle_convert(args)
+    with pytest.raises(SystemExit) as exc_info:
+        handle_convert(args)
+    assert exc_info.value.code == 1
+
+
+def test_convert_failure_closes_heading_pdf(tmp_path, fake_docling, monkeypatch):
+    """The PDF opened for heading prep is closed when conversion fails."""
+    import fitz
+
+    fake_pdf = tmp_path / "test.pdf"
+    fake_pdf.touch()
+    pdf_doc = MagicMock()
+    monkeypatch.setattr(fitz, "open", lambda *a, **kw: pdf_doc)
+    converter = fake_docling["docling.document_converter"].DocumentConverter.return_value
+    converter.convert.return_value = SimpleNamespace(
+        status=_ConversionStatus.FAILURE, errors=[]
+    )
+
+    args = _args(input=str(fake_pdf), output_dir=str(tmp_path), heading_strategy="numbering")
+
+    with pytest.raises(SystemExit) as exc_info:
+        handle_convert(args)
     assert exc_info.value.code == 1
+    pdf_doc.close.assert_called_once()
 
 
 def test_convert_input_not_found(tmp_path):
     """When input file doesn't exist, exit with error."""
-    args = MagicMock()
-    args.input = str(tmp_path / "nonexistent.pdf")
-    args.output_dir = str(tmp_path)
-    args.force = False
-    args.ocr = False
-    args.pages = None
+    args = _args(input=str(tmp_path / "nonexistent.pdf"), output_dir=str(tmp_path))
 
     with pytest.raises(SystemExit) as exc_info:
         handle_convert(args)
@@ -115,9 +154,11 @@ def test_convert_input_not_found(tmp_path):
 # --- real PDF integration test ---
 
 
-@pytest.fixture
-def sample_pdf(tmp_path):
-    """Generate a 3-page PDF with headings, paragraphs, and a table."""
+@pytest.fixture(scope="session")
+def sample_pdf_bytes():
+    """Generate a 3-page PDF with headings, paragraphs, and a table (once per session)."""
+    from fpdf import FPDF
+
     pdf = FPDF()
 
     # --- Page 1: Title + intro paragraphs ---
@@ -199,114 +240,85 @@ def sample_pdf(tmp_path):
         ),
     )
 
-    path = tmp_path / "sample.pdf"
-    pdf.output(str(path))
+    return bytes(pdf.output())
+
+
+@pytest.fixture(scope="session")
+def sample_pdf(tmp_path_factory, sample_pdf_bytes):
+    """The sample PDF written to disk, for code that takes a path."""
+    path = tmp_path_factory.mktemp("pdfs") / "sample.pdf"
+    path.write_bytes(sample_pdf_bytes)
     return path
 
 
-@pytest.mark.slow
-def test_convert_real_pdf(sample_pdf, tmp_path, capsys):
-    """Integration test: convert a real multi-page PDF and verify outputs."""
-    output_dir = tmp_path / "output"
+def _run_convert(pdf_path, output_dir, capsys, **overrides):
+    """Convert pdf_path into output_dir; return (markdown text, captured stdout)."""
     output_dir.mkdir()
+    handle_convert(_args(input=str(pdf_path), output_dir=str(output_dir), **overrides))
+    md_content = (output_dir / f"{pdf_path.stem}.md").read_text()
+    return md_content, capsys.readouterr().out
+
 
-    args = MagicMock()
-    args.input = str(sample_pdf)
-    args.output_dir = str(output_dir)
-    args.force = False
-    args.ocr = False
-    args.pages = None
-    args.heading_strategy = "bookmarks"
-    args.no_drop_empty_bookmarks = False
-    args.no_fuzzy_match = False
+@pytest.mark.parametrize("content", [b"", b"not a pdf"], ids=["empty", "garbage"])
+def test_convert_unreadable_pdf_exits_cleanly(tmp_path, capsys, fake_docling, content):
+    """An input PyMuPDF cannot open is reported as an error, not a traceback."""
+    bad_pdf = tmp_path / "bad.pdf"
+    bad_pdf.write_bytes(content)
 
-    handle_convert(args)
+    with pytest.raises(SystemExit) as exc_info:
+        _run_convert(bad_pdf, tmp_path / "output", capsys, heading_strategy="bookmarks")
+    assert exc_info.value.code == 1
+    err = capsys.readouterr().err
+    assert f"Error: cannot open {bad_pdf}" in err
+    assert "Traceback" not in err
 
-    stem = sample_pdf.stem
-    md_path = output_dir / f"{stem}.md"
-    json_path = output_dir / f"{stem}.json"
 
-    # Both outputs created
-    assert md_path.exists(), "Markdown output not created"
+@pytest.mark.slow
+def test_convert_real_pdf(sample_pdf, tmp_path, capsys):
+    """Integration test: convert a real multi-page PDF and verify outputs."""
+    output_dir = tmp_path / "output"
+    md_content, out = _run_convert(
+        sample_pdf, output_dir, capsys, heading_strategy="bookmarks"
+    )
+    json_path = output_dir / f"{sample_pdf.stem}.json"
     assert json_path.exists(), "JSON output not created"
 
-    # Markdown contains expected content
-    md_content = md_path.read_text()
-    assert "Sample Rulebook" in md_content, "Title not found in markdown"
-    assert "Chapter 1" in md_content, "Chapter 1 heading not found in markdown"
-    assert "Chapter 2" in md_content, "Chapter 2 heading not found in markdown"
-    assert "Strength" in md_content, "Table cell 'Strength' not found in markdown"
+    # Markdown contains expected content: title, both chapter headings, and a table cell
+    needles = ["Sample Rulebook", "Chapter 1", "Chapter 2", "Strength"]
+    missing = [n for n in needles if n not in md_content]
+    assert not missing, f"Not found in markdown: {missing}"
 
     # JSON is valid and is a dict
-    json_text = json_path.read_text()
-    json_data = json.loads(json_text)
+    json_data = json.loads(json_path.read_text())
     assert isinstance(json_data, dict)
 
     # Stdout summary mentions page count and table count
-    captured = capsys.readouterr()
-    assert "3 pages" in captured.out
-    assert "1 tables" in captured.out
+    assert "3 pages" in out
+    assert "1 tables" in out
 
 
 @pytest.mark.slow
-def test_convert_pages_mid_range(sample_pdf, tmp_path, capsys):
-    """--pages 2-3 should convert only pages 2-3, excluding page 1 content."""
-    output_dir = tmp_path / "output"
-    output_dir.mkdir()
-
-    args = MagicMock()
-    args.input = str(sample_pdf)
-    args.output_dir = str(output_dir)
-    args.force = False
-    args.ocr = False
-    args.pages = "2-3"
-    args.heading_strategy = "none"
-    args.no_drop_empty_bookmarks = False
-    args.no_fuzzy_match = False
-
-    handle_convert(args)
-
-    stem = sample_pdf.stem
-    md_content = (output_dir / f"{stem}.md").read_text()
-
-    # Page 1 content should be absent
-    assert "Sample Rulebook" not in md_content, "Page 1 title should not appear"
-
-    # Pages 2–3 content should be present
-    assert "Chapter 1" in md_content, "Page 2 heading not found"
-    assert "Chapter 2" in md_content, "Page 3 heading not found"
-
-    captured = capsys.readouterr()
-    assert "2 pages" in captured.out
-
-
-@pytest.mark.slow
-def test_convert_pages_single_middle(sample_pdf, tmp_path, capsys):
-    """--pages 2 should convert only page 2."""
-    output_dir = tmp_path / "output"
-    output_dir.mkdir()
-
-    args = MagicMock()
-    args.input = str(sample_pdf)
-    args.output_dir = str(output_dir)
-    args.force = False
-    args.ocr = False
-    args.pages = "2"
-    args.heading_strategy = "none"
-    args.no_drop_empty_bookmarks = False
-    args.no_fuzzy_match = False
-
-    handle_convert(args)
-
-    stem = sample_pdf.stem
-    md_content = (output_dir / f"{stem}.md").read_text()
-
-    assert "Sample Rulebook" not in md_content, "Page 1 title should not appear"
-    assert "Chapter 1" in md_content, "Page 2 heading not found"
-    assert "Chapter 2" not in md_content, "Page 3 heading should not appear"
+@pytest.mark.parametrize(
+    "pages, expected_in, expected_out, page_count",
+    [
+        # --pages 2-3 converts only pages 2-3, excluding page 1 content
+        ("2-3", ["Chapter 1", "Chapter 2"], ["Sample Rulebook"], 2),
+        # --pages 2 converts only page 2
+        ("2", ["Chapter 1"], ["Sample Rulebook", "Chapter 2"], 1),
+    ],
+    ids=["mid_range", "single_middle"],
+)
+def test_convert_pages_subset(
+    sample_pdf, tmp_path, capsys, pages, expected_in, expected_out, page_count
+):
+    """--pages converts only the requested pages."""
+    md_content, out = _run_convert(sample_pdf, tmp_path / "output", capsys, pages=pages)
 
-    captured = capsys.readouterr()
-    assert "1 pages" in captured.out
+    missing = [n for n in expected_in if n not in md_content]
+    assert not missing, f"Not found in markdown: {missing}"
+    unexpected = [n for n in expected_out if n in md_content]
+    assert not unexpected, f"Should not appear in markdown: {unexpected}"
+    assert f"{page_count} pages" in out
 
 
 @pytest.mark.slow
@@ -318,30 +330,14 @@ def test_convert_pages_mid_range_with_numbering_strategy(sample_pdf, tmp_path, c
     The numbering strategy sets an empty TOC, which forces the library to call
     _get_headers_result() — the exact code path that contained the bug.
     """
-    output_dir = tmp_path / "output"
-    output_dir.mkdir()
-
-    args = MagicMock()
-    args.input = str(sample_pdf)
-    args.output_dir = str(output_dir)
-    args.force = False
-    args.ocr = False
-    args.pages = "2-3"
-    args.heading_strategy = "numbering"
-    args.no_drop_empty_bookmarks = False
-    args.no_fuzzy_match = False
-
-    handle_convert(args)
-
-    stem = sample_pdf.stem
-    md_content = (output_dir / f"{stem}.md").read_text()
+    md_content, out = _run_convert(
+        sample_pdf, tmp_path / "output", capsys, pages="2-3", heading_strategy="numbering"
+    )
 
     assert "Sample Rulebook" not in md_content, "Page 1 title should not appear"
     assert "Chapter 1" in md_content, "Page 2 heading not found"
     assert "Chapter 2" in md_content, "Page 3 heading not found"
-
-    captured = capsys.readouterr()
-    assert "2 pages" in captured.out
+    assert "2 pages" in out
 
 
 @pytest.mark.slow
@@ -350,15 +346,7 @@ def test_convert_pages_out_of_range(sample_pdf, tmp_path):
     output_dir = tmp_path / "output"
     output_dir.mkdir()
 
-    args = MagicMock()
-    args.input = str(sample_pdf)
-    args.output_dir = str(output_dir)
-    args.force = False
-    args.ocr = False
-    args.pages = "5-10"
-    args.heading_strategy = "none"
-    args.no_drop_empty_bookmarks = False
-    args.no_fuzzy_match = False
+    args = _args(input=str(sample_pdf), output_dir=str(output_dir), pages="5-10")
 
     with pytest.raises(SystemExit) as exc_info:
         handle_convert(args)
@@ -405,32 +393,28 @@ def test_drop_redundant_removes_index_entries():
     assert "Sword, Long" not in titles      # p.55 in Part II span [50, 80)
 
 
-def test_drop_redundant_empty_input():
-    assert drop_redundant_bookmarks([]) == []
-
-
-def test_drop_redundant_all_leaf_same_level():
-    """All-leaf entries at the same level with non-overlapping pages are kept."""
-    toc = [
-        [1, "A", 1],
-        [1, "B", 10],
-        [1, "C", 20],
-    ]
-    result = drop_redundant_bookmarks(toc)
-    assert len(result) == 3
-
-
-def test_drop_redundant_l4_leaves_preserved():
-    """L4 leaf nodes are preserved when they have no non-leaf siblings."""
-    toc = [
-        [1, "Part I", 1],
-        [2, "Chapter 1", 2],
-        [3, "Section 1.1", 3],
-        [4, "Detail A", 4],
-        [4, "Detail B", 5],
-    ]
-    result = drop_redundant_bookmarks(toc)
-    assert len(result) == 5
+@pytest.mark.parametrize(
+    "toc",
+    [
+        [],
+        # All-leaf entries at the same level with non-overlapping pages
+        [[1, "A", 1], [1, "B", 10], [1, "C", 20]],
+        # L4 leaf nodes with no non-leaf siblings
+        [
+            [1, "Part I", 1],
+            [2, "Chapter 1", 2],
+            [3, "Section 1.1", 3],
+            [4, "Detail A", 4],
+            [4, "Detail B", 5],
+        ],
+        # All root entries are leaves (no hierarchy)
+        [[1, "Introduction", 1], [1, "Getting Started", 5], [1, "Appendix", 20]],
+    ],
+    ids=["empty", "all_leaf_same_level", "l4_leaves", "all_leaf_roots"],
+)
+def test_drop_redundant_keeps_everything(toc):
+    """TOCs without a positionally redundant leaf come back unchanged."""
+    assert drop_redundant_bookmarks(toc) == toc
 
 
 def test_drop_redundant_childless_l2_preserved_when_not_positionally_redundant():
@@ -481,17 +465,6 @@ def test_drop_redundant_structural_leaf_preserves_deeper_levels():
     assert "Chapter 2: Quick Start" in titles
 
 
-def test_drop_redundant_all_leaf_roots_preserved():
-    """When ALL root entries are leaf (no hierarchy), none are dropped."""
-    toc = [
-        [1, "Introduction", 1],
-        [1, "Getting Started", 5],
-        [1, "Appendix", 20],
-    ]
-    result = drop_redundant_bookmarks(toc)
-    assert len(result) == 3
-
-
 def test_drop_redundant_index_within_sibling_content():
     """L2 leaf whose page falls within an L2 non-leaf sibling's content span is dropped."""
     toc = [
@@ -513,15 +486,9 @@ def test_drop_redundant_index_within_sibling_content():
 
 
 def _make_mock_result(texts):
-    """Create a mock ConversionResult with the given text strings."""
-    mock = MagicMock()
-    items = []
-    for t in texts:
-        item = MagicMock()
-        item.text = t
-        items.append(item)
-    mock.document.texts = items
-    return mock
+    """Create a stand-in ConversionResult with the given text strings."""
+    items = [SimpleNamespace(text=t) for t in texts]
+    return SimpleNamespace(document=SimpleNamespace(texts=items))
 
 
 def test_normalize_toc_titles_case_mismatch():
@@ -561,15 +528,25 @@ def test_prepare_heading_source_none(tmp_path):
     assert title_map == {}
 
 
-def test_prepare_heading_source_numbering_returns_bytesio(sample_pdf):
+@pytest.fixture
+def sample_pdf_doc(sample_pdf_bytes):
+    """An open fitz document of the sample PDF, closed after the test."""
+    import fitz
+
+    doc = fitz.open(stream=sample_pdf_bytes, filetype="pdf")
+    yield doc
+    doc.close()
+
+
+def test_prepare_heading_source_numbering_returns_bytesio(tmp_path, sample_pdf_doc):
     """'numbering' returns a (BytesIO, {}) with an empty TOC."""
     import fitz
 
-    source, title_map = _prepare_heading_source(sample_pdf, "numbering")
+    missing = tmp_path / "missing.pdf"  # never opened when pdf_doc is given
+    source, title_map = _prepare_heading_source(missing, "numbering", pdf_doc=sample_pdf_doc)
     assert isinstance(source, BytesIO)
-    doc = fitz.open(stream=source, filetype="pdf")
-    assert doc.get_toc() == []
-    doc.close()
+    with fitz.open(stream=source, filetype="pdf") as doc:
+        assert doc.get_toc() == []
     assert title_map == {}
 
 
@@ -581,6 +558,21 @@ def test_prepare_heading_source_bookmarks_returns_bytesio(sample_pdf):
     assert isinstance(title_map, dict)
 
 
+def test_prepare_heading_source_reuses_open_document(tmp_path, sample_pdf_doc):
+    """An already-open document is used in place of the path and left open."""
+    import fitz
+
+    sample_pdf_doc.set_toc([[1, "Chapter 1: Core Rules", 2]])
+    missing = tmp_path / "missing.pdf"  # never opened when pdf_doc is given
+
+    source, title_map = _prepare_heading_source(missing, "bookmarks", pdf_doc=sample_pdf_doc)
+    assert not sample_pdf_doc.is_closed
+
+    assert title_map == {"chapter1corerules": "Chapter 1: Core Rules"}
+    with fitz.open(stream=source, filetype="pdf") as out:
+        assert out.get_toc() == [[1, "Chapter 1: Core Rules", 2]]
+
+
 # --- CLI help test ---
 
 
@@ -665,6 +657,33 @@ def test_restore_bookmark_casing_prefix_ambiguous_skipped():
     assert header.text == "Part"
 
 
+@pytest.fixture(scope="session")
+def large_title_map():
+    """A 1000-entry title map whose titles share long common prefixes."""
+    return _build_title_map([[1, f"Entry {i:04d}: Topic {i}", i + 1] for i in range(1000)])
+
+
+@pytest.mark.parametrize(
+    "text, expected",
+    [
+        ("entry 0999: topic 999", "Entry 0999: Topic 999"),  # exact key match
+        ("Entry 0500: ", "Entry 0500: Topic 500"),  # unique prefix
+        ("Entry 050", "Entry 050"),  # prefix of 0500-0509, ambiguous
+        ("Entry 1000", "Entry 1000"),  # sorts past every title
+    ],
+)
+def test_restore_bookmark_casing_large_map(large_title_map, text, expected):
+    """Prefix lookup picks only unique matches among many similar titles."""
+    from docling_core.types.doc.document import SectionHeaderItem
+
+    mock_result = MagicMock()
+    header = SectionHeaderItem.model_construct(text=text, orig=text, self_ref="#/texts/0")
+    mock_result.document.texts = [header]
+
+    restore_bookmark_casing(mock_result, large_title_map)
+    assert header.text == expected
+
+
 def test_restore_bookmark_casing_skips_non_headers():
     """Non-SectionHeaderItem text items are left unchanged."""
     mock_result = MagicMock()
@@ -696,16 +715,11 @@ def test_restore_bookmark_casing_empty_map():
 # --- CLI help test ---
 
 
-def test_heading_strategy_in_convert_help():
+def test_heading_strategy_in_convert_help(parser, capsys):
     """--heading-strategy appears in convert subcommand help."""
-    from gamagama.pdf.main import build_parser
-
-    parser = build_parser()
-    for action in parser._subparsers._actions:
-        if hasattr(action, "_parser_class"):
-            for name, subparser in action.choices.items():
-                if name == "convert":
-                    help_text = subparser.format_help()
+    with pytest.raises(SystemExit):
+        parser.parse_args(["convert", "--help"])
+    help_text = capsys.readouterr().out
     assert "--heading-strategy" in help_text
     assert "bookmarks" in help_text
     assert "numbering" in help_text
@@ -1,6 +1,4 @@
 import json
-import subprocess
-import sys
 from pathlib import Path
 from unittest.mock import patch
 
@@ -305,14 +303,11 @@ def test_resolve_conflicts_skip():
 # ---------------------------------------------------------------------------
 
 
-def test_extract_tables_subcommand_help():
-    result = subprocess.run(
-        [sys.executable, "-m", "gamagama.pdf", "extract-tables", "--help"],
-        capture_output=True,
-        text=True,
-    )
-    assert result.returncode == 0
-    assert "--force" in result.stdout
+def test_extract_tables_subcommand_help(parser, capsys):
+    with pytest.raises(SystemExit) as exc_info:
+        parser.parse_args(["extract-tables", "--help"])
+    assert exc_info.value.code == 0
+    assert "--force" in capsys.readouterr().out
 
 
 # ---------------------------------------------------------------------------
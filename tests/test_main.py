@@ -1,96 +1,61 @@
 import subprocess
 import sys
 
-from gamagama.pdf.main import build_parser
+import pytest
 
+from gamagama.pdf.main import run
 
-def test_help_exits_zero():
-    result = subprocess.run(
-        [sys.executable, "-m", "gamagama.pdf", "--help"],
-        capture_output=True,
-        text=True,
-    )
-    assert result.returncode == 0
-    assert "gg-pdf" in result.stdout
 
+def _help_text(parser, capsys, argv):
+    """Parse argv (ending in --help) and return (exit code, help output)."""
+    with pytest.raises(SystemExit) as exc_info:
+        parser.parse_args(argv)
+    return exc_info.value.code, capsys.readouterr().out
 
-def test_help_lists_subcommands():
-    result = subprocess.run(
-        [sys.executable, "-m", "gamagama.pdf", "--help"],
-        capture_output=True,
-        text=True,
-    )
-    assert "convert" in result.stdout
-    assert "split-md" in result.stdout
-    assert "extract-tables" in result.stdout
 
-
-def test_convert_help():
-    result = subprocess.run(
-        [sys.executable, "-m", "gamagama.pdf", "convert", "--help"],
-        capture_output=True,
-        text=True,
-    )
-    assert result.returncode == 0
-    assert "input" in result.stdout
-    assert "--output-dir" in result.stdout
-
-
-def test_split_md_help():
+def test_help_exits_zero():
+    """Smoke test the installed entry point in a real interpreter."""
     result = subprocess.run(
-        [sys.executable, "-m", "gamagama.pdf", "split-md", "--help"],
-        capture_output=True,
+        [sys.executable, "-m", "gamagama.pdf", "--help"],
+        stdout=subprocess.PIPE,
+        stderr=subprocess.DEVNULL,
         text=True,
     )
     assert result.returncode == 0
-    assert "input" in result.stdout
-    assert "--output-dir" in result.stdout
+    assert "gg-pdf" in result.stdout
 
 
-def test_extract_tables_help():
-    result = subprocess.run(
-        [sys.executable, "-m", "gamagama.pdf", "extract-tables", "--help"],
-        capture_output=True,
-        text=True,
-    )
-    assert result.returncode == 0
-    assert "input" in result.stdout
-    assert "--output-dir" in result.stdout
+def test_help_lists_subcommands(parser, capsys):
+    code, out = _help_text(parser, capsys, ["--help"])
+    assert code == 0
+    assert "convert" in out
+    assert "split-md" in out
+    assert "extract-tables" in out
 
 
-def test_build_parser_returns_parser():
-    parser = build_parser()
+def test_build_parser_returns_parser(parser):
     assert parser.prog == "gg-pdf"
 
 
-def test_no_args_prints_help():
-    result = subprocess.run(
-        [sys.executable, "-m", "gamagama.pdf"],
-        capture_output=True,
-        text=True,
-    )
-    assert result.returncode == 0
-    assert "gg-pdf" in result.stdout
-
-
-def test_convert_help_shows_new_args():
-    result = subprocess.run(
-        [sys.executable, "-m", "gamagama.pdf", "convert", "--help"],
-        capture_output=True,
-        text=True,
-    )
-    assert result.returncode == 0
-    assert "--ocr" in result.stdout
-    assert "--pages" in result.stdout
-    assert "--force" in result.stdout
-
-
-def test_split_md_help_shows_new_args():
-    result = subprocess.run(
-        [sys.executable, "-m", "gamagama.pdf", "split-md", "--help"],
-        capture_output=True,
-        text=True,
-    )
-    assert result.returncode == 0
-    assert "--level" in result.stdout
-    assert "--force" in result.stdout
+def test_no_args_prints_help(monkeypatch, capsys):
+    monkeypatch.setattr(sys, "argv", ["gg-pdf"])
+    with pytest.raises(SystemExit) as exc_info:
+        run()
+    assert exc_info.value.code == 0
+    assert "gg-pdf" in capsys.readouterr().out
+
+
+@pytest.mark.parametrize(
+    "command, expected",
+    [
+        ("convert", {"input", "--output-dir", "--ocr", "--pages", "--force"}),
+        ("split-md", {"input", "--output-dir", "--level", "--force"}),
+        ("extract-tables", {"input", "--output-dir", "--force"}),
+        ("bookmarks", {"input"}),
+    ],
+)
+def test_subcommand_options(parser, capsys, command, expected):
+    code, out = _help_text(parser, capsys, [command, "--help"])
+    assert code == 0
+    missing = [option for option in sorted(expected) if option not in out]
+    assert not missing, f"{command} is missing {missing}"
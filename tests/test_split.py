@@ -1,10 +1,12 @@
-from unittest.mock import MagicMock
+from pathlib import Path
+from types import SimpleNamespace
 
 import pytest
 
 from gamagama.pdf.split import (
     slugify,
     split_markdown,
+    split_markdown_spans,
     strip_image_placeholders,
     find_split_level,
     handle_split_md,
@@ -42,6 +44,10 @@ def test_slugify_special_chars():
     assert slugify("Hello, World! (2024)") == "hello-world-2024"
 
 
+def test_slugify_non_ascii_chars_are_separators():
+    assert slugify("Élan Vital — Über") == "lan-vital-ber"
+
+
 def test_slugify_empty_result():
     assert slugify("Chapter 1:") == "untitled"
 
@@ -76,79 +82,94 @@ def test_slugify_max_length_none_disables_truncation():
 # --- split_markdown tests ---
 
 
-def test_split_markdown_basic():
-    text = "preamble\n\n## Chapter 1\n\nbody 1\n\n## Chapter 2\n\nbody 2\n"
-    sections = split_markdown(text)
-    assert len(sections) == 3
-    assert sections[0][0] == ""
-    assert "preamble" in sections[0][1]
-    assert sections[1][0] == "Chapter 1"
-    assert "body 1" in sections[1][1]
-    assert sections[2][0] == "Chapter 2"
-    assert "body 2" in sections[2][1]
-
-
-def test_split_markdown_no_preamble():
-    text = "## First\n\ncontent\n"
-    sections = split_markdown(text)
-    assert len(sections) == 2
-    assert sections[0][0] == ""
-    assert sections[0][1].strip() == ""
-    assert sections[1][0] == "First"
-
-
-def test_split_markdown_level_3():
-    text = "## Keep Together\n\n### Sub A\n\nsub body\n\n### Sub B\n\nsub body 2\n"
-    sections = split_markdown(text, level=3)
-    assert len(sections) == 3
-    assert sections[0][0] == ""
-    assert "Keep Together" in sections[0][1]
-    assert sections[1][0] == "Sub A"
-    assert sections[2][0] == "Sub B"
-
-
-def test_split_markdown_ignores_subheadings():
-    text = "## Main\n\n### Sub\n\nbody\n"
-    sections = split_markdown(text, level=2)
-    assert len(sections) == 2
-    assert sections[1][0] == "Main"
-    assert "### Sub" in sections[1][1]
+@pytest.mark.parametrize(
+    "text, level, expected",
+    [
+        pytest.param(
+            "preamble\n\n## Chapter 1\n\nbody 1\n\n## Chapter 2\n\nbody 2\n",
+            2,
+            [("", "preamble"), ("Chapter 1", "body 1"), ("Chapter 2", "body 2")],
+            id="basic",
+        ),
+        pytest.param(
+            "## First\n\ncontent\n",
+            2,
+            [("", ""), ("First", "content")],
+            id="no_preamble",
+        ),
+        pytest.param(
+            "## Keep Together\n\n### Sub A\n\nsub body\n\n### Sub B\n\nsub body 2\n",
+            3,
+            [("", "## Keep Together"), ("Sub A", "sub body"), ("Sub B", "sub body 2")],
+            id="level_3",
+        ),
+        pytest.param(
+            "## Main\n\n### Sub\n\nbody\n",
+            2,
+            [("", ""), ("Main", "### Sub\n\nbody")],
+            id="ignores_subheadings",
+        ),
+        pytest.param(
+            "Just some text\nwith no headings.\n",
+            2,
+            [("", "Just some text\nwith no headings.")],
+            id="no_headings",
+        ),
+    ],
+)
+def test_split_markdown(text, level, expected):
+    """Sections come back as (heading, body) with bodies compared stripped."""
+    sections = split_markdown(text, level=level)
+    assert [(heading, body.strip()) for heading, body in sections] == expected
 
 
-def test_split_markdown_no_headings():
-    text = "Just some text\nwith no headings.\n"
-    sections = split_markdown(text)
-    assert len(sections) == 1
-    assert sections[0][0] == ""
-    assert "Just some text" in sections[0][1]
+def test_split_markdown_spans_slice_to_split_markdown_sections():
+    text = "preamble\n\n## Chapter 1\n\nbody 1\n\n### Sub\n\n## Chapter 2\n\nbody 2\n"
+    spans = split_markdown_spans(text)
+    assert [heading for heading, _, _ in spans] == ["", "Chapter 1", "Chapter 2"]
+    assert [(h, text[start:end]) for h, start, end in spans] == split_markdown(text)
 
 
 # --- strip_image_placeholders tests ---
 
 
-def test_strip_image_placeholders_single():
-    text = "before\n\n![img](image://abc123)\n\nafter\n"
-    result = strip_image_placeholders(text)
-    assert "image://" not in result
-    assert "before" in result
-    assert "after" in result
-
-
-def test_strip_image_placeholders_multiple():
-    text = "text\n\n![a](image://1)\n\n![b](image://2)\n\n![c](image://3)\n\nmore\n"
+@pytest.mark.parametrize(
+    "text, must_contain, must_not_contain",
+    [
+        pytest.param(
+            "before\n\n![img](image://abc123)\n\nafter\n",
+            ["before", "after"],
+            ["image://"],
+            id="single",
+        ),
+        pytest.param(
+            "text\n\n![a](image://1)\n\n![b](image://2)\n\n![c](image://3)\n\nmore\n",
+            ["text", "more"],
+            ["image://"],
+            id="multiple",
+        ),
+        pytest.param(
+            "![photo](https://example.com/photo.jpg)\n",
+            ["![photo](https://example.com/photo.jpg)"],
+            [],
+            id="preserves_normal_images",
+        ),
+    ],
+)
+def test_strip_image_placeholders(text, must_contain, must_not_contain):
     result = strip_image_placeholders(text)
-    assert "image://" not in result
-    assert "text" in result
-    assert "more" in result
+    for needle in must_contain:
+        assert needle in result
+    for needle in must_not_contain:
+        assert needle not in result
 
 
-def test_strip_image_placeholders_preserves_normal_images():
-    text = "![photo](https://example.com/photo.jpg)\n"
-    result = strip_image_placeholders(text)
-    assert "![photo](https://example.com/photo.jpg)" in result
+# --- handle_split_md tests ---
 
 
-# --- handle_split_md tests ---
+def _args(input, output_dir, level, force=False):
+    """Build handle_split_md args."""
+    return SimpleNamespace(input=input, output_dir=output_dir, level=level, force=force)
 
 
 def test_handle_split_md_basic(tmp_path, capsys):
@@ -162,11 +183,7 @@ def test_handle_split_md_basic(tmp_path, capsys):
     input_file.write_text(md_content)
     output_dir = tmp_path / "output"
 
-    args = MagicMock()
-    args.input = str(input_file)
-    args.output_dir = str(output_dir)
-    args.level = 2
-    args.force = False
+    args = _args(input=str(input_file), output_dir=str(output_dir), level=2)
 
     handle_split_md(args)
 
@@ -189,11 +206,7 @@ def test_handle_split_md_basic(tmp_path, capsys):
 
 
 def test_handle_split_md_input_not_found(tmp_path):
-    args = MagicMock()
-    args.input = str(tmp_path / "nonexistent.md")
-    args.output_dir = str(tmp_path)
-    args.level = 2
-    args.force = False
+    args = _args(input=str(tmp_path / "nonexistent.md"), output_dir=str(tmp_path), level=2)
 
     with pytest.raises(SystemExit) as exc_info:
         handle_split_md(args)
@@ -208,11 +221,7 @@ def test_handle_split_md_warns_on_long_heading(tmp_path, capsys):
     input_file.write_text(md_content)
     output_dir = tmp_path / "output"
 
-    args = MagicMock()
-    args.input = str(input_file)
-    args.output_dir = str(output_dir)
-    args.level = 2
-    args.force = False
+    args = _args(input=str(input_file), output_dir=str(output_dir), level=2)
 
     handle_split_md(args)
 
@@ -236,15 +245,34 @@ def test_handle_split_md_refuses_overwrite(tmp_path):
     output_dir.mkdir()
     (output_dir / "01-chapter-1.md").write_text("old")
 
-    args = MagicMock()
-    args.input = str(input_file)
-    args.output_dir = str(output_dir)
-    args.level = 2
-    args.force = False
+    args = _args(input=str(input_file), output_dir=str(output_dir), level=2)
+
+    with pytest.raises(SystemExit) as exc_info:
+        handle_split_md(args)
+    assert exc_info.value.code == 1
+
+
+def test_handle_split_md_never_overwrites_file_created_after_check(tmp_path, monkeypatch):
+    """A file that appears between the overwrite check and the write is kept."""
+    input_file = tmp_path / "book.md"
+    input_file.write_text("## Chapter 1\n\ncontent\n")
+    output_dir = tmp_path / "output"
+    output_dir.mkdir()
+    (output_dir / "01-chapter-1.md").write_text("old")
+    # Hide the existing file from the batch check
+    real_exists = Path.exists
+    monkeypatch.setattr(
+        Path,
+        "exists",
+        lambda self, **kwargs: self.parent != output_dir and real_exists(self, **kwargs),
+    )
+
+    args = _args(input=str(input_file), output_dir=str(output_dir), level=2)
 
     with pytest.raises(SystemExit) as exc_info:
         handle_split_md(args)
     assert exc_info.value.code == 1
+    assert (output_dir / "01-chapter-1.md").read_text() == "old"
 
 
 # --- find_split_level tests ---
@@ -273,7 +301,7 @@ def test_find_split_level_h1():
 # --- handle_split_md auto-level tests ---
 
 
-def test_handle_split_md_auto_level(tmp_path, capsys):
+def test_handle_split_md_auto_level(tmp_path):
     """When --level is None, auto-detect splits on ## headings."""
     md_content = (
         "# Title\n\nIntro.\n\n"
@@ -284,11 +312,7 @@ def test_handle_split_md_auto_level(tmp_path, capsys):
     input_file.write_text(md_content)
     output_dir = tmp_path / "output"
 
-    args = MagicMock()
-    args.input = str(input_file)
-    args.output_dir = str(output_dir)
-    args.level = None
-    args.force = False
+    args = _args(input=str(input_file), output_dir=str(output_dir), level=None)
 
     handle_split_md(args)
 
@@ -301,7 +325,7 @@ def test_handle_split_md_auto_level(tmp_path, capsys):
     assert ch1.startswith("## Chapter 1")
 
 
-def test_handle_split_md_explicit_level_overrides(tmp_path, capsys):
+def test_handle_split_md_explicit_level_overrides(tmp_path):
     """Explicit --level overrides auto-detection."""
     md_content = (
         "## Parent\n\n### Sub A\n\nContent A.\n\n### Sub B\n\nContent B.\n"
@@ -310,11 +334,7 @@ def test_handle_split_md_explicit_level_overrides(tmp_path, capsys):
     input_file.write_text(md_content)
     output_dir = tmp_path / "output"
 
-    args = MagicMock()
-    args.input = str(input_file)
-    args.output_dir = str(output_dir)
-    args.level = 3
-    args.force = False
+    args = _args(input=str(input_file), output_dir=str(output_dir), level=3)
 
     handle_split_md(args)
 